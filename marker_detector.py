@@ -1,11 +1,35 @@
 import cv2 as cv
 import numpy as np
-from math import cos, sin, radians
-
-
+from typing import TextIO
+from numba import njit
+
+# Steps of the two coordinates of the Bresenham line generator, indexed by
+# (x0 > x1) << 2 | (y0 > y1) << 1 | (slope >= 1). When the slope is smaller
+# than one the coordinates are swapped, so xStep moves along y and yStep
+# along x.
+_BRESENHAM_STEPS = np.array(
+    [
+        [1, 1],
+        [1, 1],
+        [-1, 1],
+        [1, -1],
+        [1, -1],
+        [-1, 1],
+        [-1, -1],
+        [-1, -1],
+    ],
+    dtype=np.int64,
+)
+
+
+# The line generator is not used by detectAndLabelMarkers anymore, which
+# samples the marker axes directly in decodeMarkers: it is kept only as part
+# of the module's public API. Being compiled lazily, it costs nothing to the
+# detector unless it is called.
+@njit(cache=True, fastmath=True)
 def bresenhamLineGenerator(x0, y0, x1, y1):
-    """Generates a list of point represeting a line
-    between the two given points. The list will always
+    """Generates an array of points represeting a line
+    between the two given points. The array will always
     start from (x0, y0), which in this use-case means
     from the concave corner of the related marker.
 
@@ -16,7 +40,7 @@ def bresenhamLineGenerator(x0, y0, x1, y1):
         y1 (int): point 1's y coordinate.
 
     Returns:
-        list[int]: list of points.
+        np.ndarray: (N, 2) int32 array of points, possibly a non-contiguous view.
     """
 
     dx = abs(x1 - x0)
@@ -27,21 +51,16 @@ def bresenhamLineGenerator(x0, y0, x1, y1):
     # hence any value can fit to handle this case (e.g., 10.).
     slope = dy / dx if dx != 0 else 10.0
 
-    flag = True
-
-    linePixel = []
-    linePixel.append((x0, y0))
-
     # Step initialized according to the type of slope
-    # and position of X and Y.
-    yStep = -1 if slope >= 1.0 and y0 > y1 else 1
-    xStep = (
-        -1
-        if ((x0 > x1 or y0 > y1) and slope < 1.0)
-        or (slope > 1.0 and x0 > x1 and y0 > y1)
-        or (x0 > x1 and y0 < y1)
-        else 1
-    )
+    # and position of X and Y, looked up through them.
+    stepIndex = int(x0 > x1) << 2 | int(y0 > y1) << 1 | int(slope >= 1.0)
+    xStep = int(_BRESENHAM_STEPS[stepIndex, 0])
+    yStep = int(_BRESENHAM_STEPS[stepIndex, 1])
+
+    # The number of steps is known up-front, so the output
+    # is preallocated instead of being grown point by point.
+    nsteps = max(dx, dy)
+    linePixel = np.empty((nsteps + 1, 2), dtype=np.int32)
 
     slopeSmallerThanOne = False
     if slope < 1:
@@ -50,72 +69,361 @@ def bresenhamLineGenerator(x0, y0, x1, y1):
         dy = abs(y1 - y0)
         slopeSmallerThanOne = True
 
-    p0 = 2 * dx - dy
+    p = 2 * dx - dy
     x = x0
     y = y0
+    linePixel[0, 0] = x
+    linePixel[0, 1] = y
 
-    # This method is invoked quite often, and each for loop
-    # iterates an hundred times on average, so I chose to keep
-    # it redundant with the two different appends, instead of
-    # keeping a single for-loop with a control in it.
     # This loop proceeds step by step into generating the line.
     # Both X and Y require a dynamic step because of the different
     # slopes to handle.
-    # If the slope is smaller than one, x and y will be appended
-    # as (y, x), and not (x, y).
+    for i in range(1, nsteps + 1):
+        xPrevious = x
+        if p >= 0:
+            x = x + xStep
+
+        p = p + 2 * dx - 2 * dy * (abs(x - xPrevious))
+        y = y + yStep
+        linePixel[i, 0] = x
+        linePixel[i, 1] = y
+
+    # If the slope is smaller than one, the points have been stored
+    # as (y, x), so the columns are swapped through a view.
     if slopeSmallerThanOne:
-        for _ in range(abs(y1 - y0)):
-            if flag:
-                xPrevious = x0
-                pPrevious = p0
-                p = p0
-                flag = False
-            else:
-                xPrevious = x
-                pPrevious = p
-
-            if p >= 0:
-                x = x + xStep
-
-            p = pPrevious + 2 * dx - 2 * dy * (abs(x - xPrevious))
-            y = y + yStep
-            linePixel.append((y, x))
-    else:
-        for _ in range(abs(y1 - y0)):
-            if flag:
-                xPrevious = x0
-                pPrevious = p0
-                p = p0
-                flag = False
+        return linePixel[:, ::-1]
+    return linePixel
+
+
+# The axis going from the concave corner to the middle point of the lower
+# side is splitted into pieces of (steps + 1) / 10 * 1.95 points each (truncated),
+# and the k-th circle's center is theoretically at the end of the k-th piece.
+# The axis is perspectively warped, though, so a little correction is
+# applied to the index of each circle's center (truncated again).
+AXIS_SAMPLE_CORRECTIONS = np.array([0.9, 0.85, 0.85, 0.85, 0.85])
+
+
+# 3D coordinates of the markers, looked up through their labels: the
+# marker labelled as n lies on a circle of radius 70, rotated by
+# n * -15 degrees.
+_markerAngles = np.radians(-15) * np.arange(32)
+MARKER_COORDS_X = np.cos(_markerAngles) * 70
+MARKER_COORDS_Y = np.sin(_markerAngles) * 70
+
+
+# Gray level under which a slot of a marker is considered black
+# (180 seems a good threshold to discriminate them according to
+# some prints).
+SLOT_THRESHOLD = np.uint8(180)
+
+
+@njit(cache=True)
+def _sameVertex(xs, ys, marker, firstVertex, secondVertex):
+    """Check if two vertices of the same marker have the same coordinates.
+
+    Args:
+        xs (np.ndarray): (K, 5) int32 array with the x coordinates of the vertices.
+        ys (np.ndarray): (K, 5) int32 array with the y coordinates of the vertices.
+        marker (int): index of the marker.
+        firstVertex (int): index of the first vertex.
+        secondVertex (int): index of the second vertex.
+
+    Returns:
+        bool: True if the two vertices coincide.
+    """
+    return (
+        xs[marker, firstVertex] == xs[marker, secondVertex]
+        and ys[marker, firstVertex] == ys[marker, secondVertex]
+    )
+
+
+# The kernel is compiled eagerly, at import, for the contiguous int32 arrays
+# built by detectAndLabelMarkers and the uint8 grayscale buffer, so that the
+# first frame does not pay for the JIT compilation.
+@njit(
+    "Tuple((int32[:, ::1], int32[:, :, ::1], int64[::1]))"
+    "(int32[:, ::1], int32[:, ::1], uint8[:, ::1])",
+    cache=True,
+)
+def decodeMarkers(xs, ys, gray):
+    """Find the concave corner "A" of every marker, and traverse the axis going
+    from it to the middle point of the lower side, looking for the white circles
+    in fixed positions.
+
+    Args:
+        xs (np.ndarray): (K, 5) int32 array with the x coordinates of the markers'
+        vertices.
+        ys (np.ndarray): (K, 5) int32 array with the y coordinates of the markers'
+        vertices.
+        gray (np.ndarray): uint8 grayscale image where the markers were detected.
+
+    Returns:
+        tuple[np.ndarray]: (K, 2) concave corners, (K, 5, 2) sampled points and
+        (K,) binary codes of the markers. The code is -1 for the markers whose
+        concave corner could not be found.
+    """
+
+    totalMarkers = xs.shape[0]
+    totalVertices = xs.shape[1]
+    concaveCorners = np.zeros((totalMarkers, 2), dtype=np.int32)
+    samplePoints = np.zeros((totalMarkers, 5, 2), dtype=np.int32)
+    binaryReprs = np.full(totalMarkers, -1, dtype=np.int64)
+    matchingSides = np.empty(3, dtype=np.int64)
+
+    # Cycle through every marker, and find for each of them the point A.
+    # Take the 3 shortest sides of each marker: the A point will be
+    # the one where two of such sides meet.
+    for marker in range(totalMarkers):
+        # Retreving the 3 shortest sides for the actual polygon.
+        # I chose 80 as filter because sides larger then 80 are
+        # the long sides, which are not useful for the detection
+        # of A. Squared lengths are compared against 80 ** 2, so
+        # that no square root is required.
+        totalMatchingSides = 0
+        for vertex in range(totalVertices):
+            nextVertex = (vertex + 1) % totalVertices
+            sideX = xs[marker, nextVertex] - xs[marker, vertex]
+            sideY = ys[marker, nextVertex] - ys[marker, vertex]
+            if sideX * sideX + sideY * sideY < 6400:
+                # A fourth short side means that the polygon is not a marker.
+                if totalMatchingSides == 3:
+                    totalMatchingSides += 1
+                    break
+                matchingSides[totalMatchingSides] = vertex
+                totalMatchingSides += 1
+        if totalMatchingSides != 3:
+            continue
+
+        # Control the 3 sides by couples, (0, 1), (1, 2) and (2, 0), to
+        # find the two of them meeting in "A": the remaining one is the
+        # lower side. The search stops at the first matching couple.
+        for loopIndex in range(3):
+            # Legend:
+            #   - firstSide: index of the first vertex of the currently examined side.
+            #   - secondSide: index of the first vertex of the next matching side.
+            #   - the second vertex of each side follows the first one.
+            firstSide = matchingSides[loopIndex]
+            firstSideEnd = (firstSide + 1) % totalVertices
+            secondSide = matchingSides[(loopIndex + 1) % 3]
+            secondSideEnd = (secondSide + 1) % totalVertices
+
+            # Check if the two currently examined sides have a common point: if so,
+            # store it for the next operations. If no match is found, keep iterating.
+            if _sameVertex(xs, ys, marker, firstSide, secondSide) or _sameVertex(
+                xs, ys, marker, firstSide, secondSideEnd
+            ):
+                concaveCorner = firstSide
+            elif _sameVertex(xs, ys, marker, firstSideEnd, secondSide) or _sameVertex(
+                xs, ys, marker, firstSideEnd, secondSideEnd
+            ):
+                concaveCorner = firstSideEnd
             else:
-                xPrevious = x
-                pPrevious = p
+                continue
+
+            # "A" was found, so I use it and the middle point on the lower side
+            # of the marker to look in the 5 areas where each circle should
+            # reside, obtaining in such way the binary value of each marker.
+            lowerSide = matchingSides[(loopIndex + 2) % 3]
+            lowerSideEnd = (lowerSide + 1) % totalVertices
+            cornerX = xs[marker, concaveCorner]
+            cornerY = ys[marker, concaveCorner]
+            middlePointX = (xs[marker, lowerSide] + xs[marker, lowerSideEnd]) >> 1
+            middlePointY = (ys[marker, lowerSide] + ys[marker, lowerSideEnd]) >> 1
+            concaveCorners[marker, 0] = cornerX
+            concaveCorners[marker, 1] = cornerY
+
+            # Index, along the axis, of the points to sample: the axis has as
+            # many points as the steps along its major direction, plus one.
+            # The coordinate along the major direction is moved by exactly one
+            # pixel per index, as a line drawn through Bresenham would do.
+            axisX = middlePointX - cornerX
+            axisY = middlePointY - cornerY
+            axisSteps = max(abs(axisX), abs(axisY))
+            cycleJump = np.floor((axisSteps + 1) / 10 * 1.95)
+            axisSteps = max(axisSteps, 1)
+
+            # Store the slots status: white or black.
+            # The comparison result is used directly as the bit of the slot,
+            # the first sampled slot being the least significant one, so that
+            # no branch depends on the image content. The threshold has the
+            # same dtype of the image, so that uint8 values are compared.
+            binaryRepr = 0
+            for slot in range(5):
+                sampleIndex = np.floor(
+                    cycleJump * (slot + 1) * AXIS_SAMPLE_CORRECTIONS[slot]
+                )
+                sampleX = np.int32(np.rint(cornerX + sampleIndex * axisX / axisSteps))
+                sampleY = np.int32(np.rint(cornerY + sampleIndex * axisY / axisSteps))
+                samplePoints[marker, slot, 0] = sampleX
+                samplePoints[marker, slot, 1] = sampleY
+                binaryRepr |= np.int64(gray[sampleY, sampleX] <= SLOT_THRESHOLD) << slot
+            binaryReprs[marker] = binaryRepr
+            break
 
-            if p >= 0:
-                x = x + xStep
+    return concaveCorners, samplePoints, binaryReprs
 
-            p = pPrevious + 2 * dx - 2 * dy * (abs(x - xPrevious))
-            y = y + yStep
-            linePixel.append((x, y))
 
-    return linePixel
+# Strokes writing the labels, as (color, thickness) couples: a thick black
+# outline first, and then the white text on top of it.
+_LABEL_STROKES = (((0, 0, 0), 9), ((255, 255, 255), 3))
+_LABEL_OUTLINE_THICKNESS = max(thickness for _, thickness in _LABEL_STROKES)
+
+
+def _putLabel(
+    image: np.ndarray, text: str, origin: tuple[int, int], color=None
+) -> None:
+    """Write a label through cv.putText, drawing all its strokes.
+
+    Args:
+        image (np.ndarray): image where the label is written.
+        text (str): text of the label.
+        origin (tuple[int]): bottom-left corner of the text.
+        color (optional): if given, all the strokes are drawn with this color
+        instead of their own one, e.g. to obtain the mask of the label.
+    """
+
+    # The text is drawn without anti-aliasing, so that its mask is binary.
+    for strokeColor, thickness in _LABEL_STROKES:
+        cv.putText(
+            img=image,
+            text=text,
+            org=origin,
+            fontScale=1.0,
+            fontFace=cv.FONT_HERSHEY_SIMPLEX,
+            color=strokeColor if color is None else color,
+            thickness=thickness,
+            lineType=cv.LINE_8,
+        )
+
+
+def _renderLabelSprite(label: int) -> tuple[np.ndarray, np.ndarray, int, int]:
+    """Render a marker label as it is written on the image: white text with
+    a thick black outline.
+
+    Args:
+        label (int): label of the marker.
+
+    Returns:
+        tuple: BGR sprite, boolean mask of its drawn pixels, and horizontal and
+        vertical offsets of its top-left corner from the text origin.
+    """
+
+    text = str(label)
+    (textWidth, textHeight), baseline = cv.getTextSize(
+        text, cv.FONT_HERSHEY_SIMPLEX, 1.0, _LABEL_OUTLINE_THICKNESS
+    )
+    # Leave enough room for the outline around the text, it is cropped later.
+    padding = _LABEL_OUTLINE_THICKNESS
+    origin = (padding, padding + textHeight)
+    canvasShape = (textHeight + baseline + 2 * padding, textWidth + 2 * padding)
+
+    sprite = np.zeros((*canvasShape, 3), dtype=np.uint8)
+    mask = np.zeros(canvasShape, dtype=np.uint8)
+    _putLabel(mask, text, origin, color=255)
+    _putLabel(sprite, text, origin)
+
+    # The outline covers the whole text, so its bounding box is the sprite's.
+    x, y, width, height = cv.boundingRect(mask)
+    return (
+        sprite[y : y + height, x : x + width],
+        mask[y : y + height, x : x + width] > 0,
+        x - origin[0],
+        y - origin[1],
+    )
+
+
+# There are only 32 possible labels, so each of them is rendered once,
+# and then copied on the image for every marker.
+_labelSprites = {label: _renderLabelSprite(label) for label in range(32)}
+
+
+def drawLabel(image: np.ndarray, label: int, origin: tuple[int, int]) -> None:
+    """Write the label of a marker on the image.
+
+    Args:
+        image (np.ndarray): BGR image where the label is written.
+        label (int): label of the marker.
+        origin (tuple[int]): bottom-left corner of the text, as in cv.putText.
+    """
+
+    sprite, mask, offsetX, offsetY = _labelSprites[label]
+    left = origin[0] + offsetX
+    top = origin[1] + offsetY
+    right = left + mask.shape[1]
+    bottom = top + mask.shape[0]
+
+    # OpenCV clips the thick strokes crossing the image borders, which
+    # changes their rasterization: in such case the label is written
+    # through cv.putText, so that the result does not change.
+    if left < 0 or top < 0 or right > image.shape[1] or bottom > image.shape[0]:
+        _putLabel(image, str(label), origin)
+        return
+
+    np.copyto(image[top:bottom, left:right], sprite, where=mask[:, :, None])
+
+
+# The per-pixel preprocessing of each frame runs on the GPU whenever
+# OpenCV has been built with CUDA support and a device is available.
+# The device buffers are reused across frames.
+CUDA_ENABLED = hasattr(cv, "cuda") and cv.cuda.getCudaEnabledDeviceCount() > 0
+if CUDA_ENABLED:
+    _gpuImage = cv.cuda_GpuMat()
+    _gpuGray = cv.cuda_GpuMat()
+    _gpuThresh = cv.cuda_GpuMat()
+
+# Host buffers receiving the grayscale and thresholded images, reused
+# across frames and allocated again only when the frame size changes.
+_preprocessBuffers = {"gray": None, "thresh": None}
 
 
-def computeDistance(p1, p2):
-    """Compute the euclidean distance between p1 and p2.
+def preprocessImage(image: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Convert the input image to grayscale, discard the part of it where
+    the markers are not looked for, and binarize it.
 
     Args:
-        p1 (tuple[int]): first point.
-        p2 (tuple[int]): second point.
+        image (np.ndarray): input BGR image.
 
     Returns:
-        float: Euclidean distance between p1 and p2.
+        tuple[np.ndarray]: grayscale image and its thresholded version. Both
+        are overwritten by the next call.
     """
-    return ((p2[0] - p1[0]) ** 2 + (p2[1] - p1[1]) ** 2) ** 0.5
+
+    frameShape = image.shape[:2]
+    if (
+        _preprocessBuffers["gray"] is None
+        or _preprocessBuffers["gray"].shape != frameShape
+    ):
+        _preprocessBuffers["gray"] = np.empty(frameShape, dtype=np.uint8)
+        _preprocessBuffers["thresh"] = np.empty(frameShape, dtype=np.uint8)
+    gray = _preprocessBuffers["gray"]
+    thresh = _preprocessBuffers["thresh"]
+
+    if CUDA_ENABLED:
+        # Only the results are downloaded: findContours has no CUDA
+        # counterpart, and the grayscale image is sampled on the CPU.
+        _gpuImage.upload(image)
+        cv.cuda.cvtColor(_gpuImage, cv.COLOR_BGR2GRAY, dst=_gpuGray)
+        _gpuGray.colRange(0, min(1200, frameShape[1])).setTo(0)
+        cv.cuda.threshold(_gpuGray, 190, 255, cv.THRESH_BINARY, dst=_gpuThresh)
+        _gpuGray.download(gray)
+        _gpuThresh.download(thresh)
+        return gray, thresh
+
+    cv.cvtColor(image, cv.COLOR_BGR2GRAY, dst=gray)
+    # Discarded part of the image because the smallest
+    # visible markers tend to be misdetected being them
+    # adjacent to the plastic cup.
+    # The strip is filled through OpenCV, which vectorizes the store.
+    cv.rectangle(gray, (0, 0), (1199, frameShape[0] - 1), 0, thickness=cv.FILLED)
+    # 190 detects markers pretty well, but still requires an
+    # area control for small fake-markers appearing on the plastic
+    # cup.
+    cv.threshold(gray, 190, 255, cv.THRESH_BINARY, dst=thresh)
+    return gray, thresh
 
 
 def detectAndLabelMarkers(
-    image: np.ndarray, currentFrame: int, objectToTrack: int
+    image: np.ndarray, currentFrame: int, outputFile: TextIO
 ) -> None:
     """Detect the visible markers through their contours and then determine for
     each of them the line which crosses all the circles from the bottom of the marker
@@ -126,192 +434,85 @@ def detectAndLabelMarkers(
         image (np.ndarray): input image.
         currentFrame (int): index of the current image with respect to the total number
         of frames in the video.
-        objectToTrack (int): index of the chosen video. Required to write the rows in the
-        related csv file.
+        outputFile (TextIO): csv file of the chosen video, opened by the caller, where
+        the rows related to the current image are written.
     """
 
     outputFileContent = ""
-    gray = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
-    # Discarded part of the image because the smallest
-    # visible markers tend to be misdetected being them
-    # adjacent to the plastic cup.
-    gray[:, 0:1200:] = 0
-    # 190 detects markers pretty well, but still requires an
-    # area control for small fake-markers appearing on the plastic
-    # cup.
-    _, thresh = cv.threshold(gray, 190, 255, cv.THRESH_BINARY)
+    gray, thresh = preprocessImage(image)
 
     # I use CHAIN_APPROX_SIMPLE because it removes all redundant points
     # and compresses the contour, thereby saving memory.
     contours, _ = cv.findContours(thresh, cv.RETR_TREE, cv.CHAIN_APPROX_SIMPLE)
 
     # Searching through every region selected to find the required polygon.
-    polygons = [
-        approx
-        for cnt in contours
-        if cv.contourArea(cnt) > 1200
-        and len(approx := cv.approxPolyDP(cnt, 0.0155 * cv.arcLength(cnt, True), True))
-        == 5
-    ]
-    cv.drawContours(image, polygons, -1, (0, 255, 0), 2)
-
-    # Cycle through every marker, and find for each of them the point A.
-    # Take the 3 shortest sides of each marker: the A point will be
-    # the one where two of such sides meet.
-    for poly in polygons:
-        concaveCornerPoint = None
-        lowerSideMiddlePoint = None
-        totalVertices = len(poly)
-        # Retreving the 3 shortest sides for the actual polygon.
-        # I chose 80 as filter because sides larger then 80 are
-        # the long sides, which are not useful for the detection
-        # of A.
-        matchingSides = [
-            vertexIndex
-            for vertexIndex, vertex in enumerate(poly)
-            if computeDistance(vertex[0], poly[(vertexIndex + 1) % totalVertices][0])
-            < 80.0
-        ]
-        # Iterate through the 3 sides and control them by couples to
-        # find which of them match
-        for loopIndex, side in enumerate(matchingSides):
-            cornerFound = False
-
-            # Legend:
-            #   - Side: index of the first vertex of the currently examined side.
-            #   - (side + 1) % totalVertices: index of the second vertex of the currently examined side.
-            #   - matchingSides[(loopIndex + 1) % 3]: index of the first vertex of the next matching side.
-            #   - (matchingSides[(loopIndex + 1) % 3] + 1) % totalVertices: index of the second vertex
-            #                                                               of the next matching side.
-            firstSideFirstPoint = poly[side][0]
-            firstSideSecondPoint = poly[(side + 1) % totalVertices][0]
-            secondSideFirstPoint = poly[matchingSides[(loopIndex + 1) % 3]][0]
-            secondSideSecondPoint = poly[
-                (matchingSides[(loopIndex + 1) % 3] + 1) % totalVertices
-            ][0]
-
-            # Check if the two currently examined sides have a common point: if so,
-            # store it for the next operations, and record that the matching lines
-            # have been found for this marker. If no match is found, keep iterating.
-            if (firstSideFirstPoint == secondSideFirstPoint).all() or (
-                firstSideFirstPoint == secondSideSecondPoint
-            ).all():
-                cornerFound = True
-                concaveCornerPoint = firstSideFirstPoint
-            elif (firstSideSecondPoint == secondSideFirstPoint).all() or (
-                firstSideSecondPoint == secondSideSecondPoint
-            ).all():
-                cornerFound = True
-                concaveCornerPoint = firstSideSecondPoint
-
-            if cornerFound:
-                cv.circle(
-                    image,
-                    (
-                        concaveCornerPoint[0],
-                        concaveCornerPoint[1],
-                    ),
-                    radius=1,
-                    color=(0, 0, 255),
-                    thickness=6,
-                )
-
-                # "A" was found, so I use it to generate a line between it and
-                # the middle point on the lower side of the marker: I use this
-                # line to look in the 5 areas where each circle should reside,
-                # obtaining in such way the binary value of each marker.
-                lowerSide = (
-                    poly[matchingSides[(loopIndex + 2) % 3]][0],
-                    poly[(matchingSides[(loopIndex + 2) % 3] + 1) % totalVertices][0],
-                )
-                middlePointX = (lowerSide[0][0] + lowerSide[1][0]) // 2
-                middlePointY = (lowerSide[0][1] + lowerSide[1][1]) // 2
-                lowerSideMiddlePoint = (middlePointX, middlePointY)
-
-                # Use the found middle point and "A" to generate the line
-                # between them.
-                markerAxis = bresenhamLineGenerator(
-                    concaveCornerPoint[0],
-                    concaveCornerPoint[1],
-                    lowerSideMiddlePoint[0],
-                    lowerSideMiddlePoint[1],
-                )
-                markerAxisLen = len(markerAxis)
-                actCycle = 0
-                cycleJump = int(markerAxisLen / 10 * 1.95)
-                binaryRepr = ""
-                for intervalCentreIndex in range(cycleJump, markerAxisLen, cycleJump):
-                    tempIndex = intervalCentreIndex
-
-                    # This if-elif block performs a little correction on the
-                    # place where to look for the white circles: theoretically,
-                    # the line generated through bresenham should be splitted into
-                    # 5 pieces, and the detection of each circle should be made by
-                    # looking into the centers of such pieces, but the line is
-                    # perspectively warped, so an adjustment is required when
-                    # looking for each circle's center.
-                    if actCycle in [1, 2, 3, 4]:
-                        tempIndex = int(tempIndex * 0.85)
-                    elif actCycle == 0:
-                        tempIndex = int(tempIndex * 0.9)
-                    actCycle += 1
-
-                    # Store the current slot status: white or black.
-                    # (180 seems a good threshold to discriminate them
-                    # according to some prints).
-                    binaryRepr += (
-                        "0"
-                        if gray[
-                            markerAxis[tempIndex][1],
-                            markerAxis[tempIndex][0],
-                        ]
-                        > 180
-                        else "1"
-                    )
-                    # Draw the center of the actual circle.
-                    cv.circle(
-                        image,
-                        (
-                            markerAxis[tempIndex][0],
-                            markerAxis[tempIndex][1],
-                        ),
-                        radius=1,
-                        color=(255, 0, 0),
-                        thickness=2,
-                    )
-                # Reverse the binary representation, which was captured backward,
-                # and write it on the marker in decimal representation.
-                # Also, using the computed label, access the related 3D coords.
-                binaryRepr = int(binaryRepr[::-1], 2)
-                binaryReprStr = str(binaryRepr)
-
-                radAngle = radians(-15)
-                qx = cos(radAngle * binaryRepr) * 70
-                qy = sin(radAngle * binaryRepr) * 70
-                outputFileContent = (
-                    outputFileContent
-                    + f"{currentFrame},{binaryReprStr},{markerAxis[0][0]},{markerAxis[0][1]},{qx},{qy},0\n"
-                )
-                image = cv.putText(
-                    img=image,
-                    text=binaryReprStr,
-                    org=(markerAxis[0][0], markerAxis[0][1]),
-                    fontScale=1.0,
-                    fontFace=cv.FONT_HERSHEY_SIMPLEX,
-                    color=(0, 0, 0),
-                    thickness=9,
-                )
-                image = cv.putText(
-                    img=image,
-                    text=binaryReprStr,
-                    org=(markerAxis[0][0], markerAxis[0][1]),
-                    fontScale=1.0,
-                    fontFace=cv.FONT_HERSHEY_SIMPLEX,
-                    color=(255, 255, 255),
-                    thickness=3,
-                )
-                break
+    # Most of the contours are tiny, so the cheapest controls come first:
+    # a contour with less than 5 points cannot be approximated by a pentagon,
+    # and the area of the bounding box is an upper bound for the contour's one.
+    polygons = []
+    for cnt in contours:
+        if len(cnt) < 5:
+            continue
+        _, _, width, height = cv.boundingRect(cnt)
+        if width * height <= 1200 or cv.contourArea(cnt) <= 1200:
+            continue
+        approx = cv.approxPolyDP(cnt, 0.0155 * cv.arcLength(cnt, True), True)
+        if len(approx) == 5:
+            polygons.append(approx)
+
+    # Nothing to draw nor to write for the frames without visible markers.
+    if not polygons:
+        return
+
+    cv.polylines(image, polygons, isClosed=True, color=(0, 255, 0), thickness=2)
+
+    # All the polygons are packed into a single (K, 5, 2) array, which is then
+    # split into two contiguous (K, 5) arrays holding the x and the y coordinates
+    # of the vertices, and all the markers are decoded at once.
+    polys = np.array([poly[:, 0, :] for poly in polygons], dtype=np.int32).reshape(
+        -1, 5, 2
+    )
+    xs = np.ascontiguousarray(polys[:, :, 0])
+    ys = np.ascontiguousarray(polys[:, :, 1])
+    concaveCorners, samplePoints, binaryReprs = decodeMarkers(xs, ys, gray)
+
+    for concaveCornerPoint, markerSamplePoints, binaryRepr in zip(
+        concaveCorners.tolist(), samplePoints.tolist(), binaryReprs.tolist()
+    ):
+        # No couple of short sides meeting in "A" was found.
+        if binaryRepr < 0:
+            continue
+
+        cv.circle(
+            image,
+            (
+                concaveCornerPoint[0],
+                concaveCornerPoint[1],
+            ),
+            radius=1,
+            color=(0, 0, 255),
+            thickness=6,
+        )
+        for sampleX, sampleY in markerSamplePoints:
+            # Draw the center of the actual circle.
+            cv.circle(
+                image,
+                (sampleX, sampleY),
+                radius=1,
+                color=(255, 0, 0),
+                thickness=2,
+            )
+
+        # Write the label on the marker in decimal representation.
+        # Also, using the computed label, access the related 3D coords.
+        binaryReprStr = str(binaryRepr)
+
+        qx = MARKER_COORDS_X[binaryRepr]
+        qy = MARKER_COORDS_Y[binaryRepr]
+        outputFileContent = (
+            outputFileContent
+            + f"{currentFrame},{binaryReprStr},{concaveCornerPoint[0]},{concaveCornerPoint[1]},{qx},{qy},0\n"
+        )
+        drawLabel(image, binaryRepr, concaveCornerPoint)
 
-    outputFile = open(f"obj{objectToTrack}_marker.csv", "a")
     outputFile.write(outputFileContent)
-    outputFile.close()